@@ -12,6 +12,7 @@ from pyarrow import ArrowIOError
 from pyarrow.lib import ArrowInvalid
 from compute_ldscores_from_ld import compute_ldscores_chr
 import tempfile
+from joblib import Parallel, delayed
 
 
 MAX_CHI2=80
@@ -410,10 +411,10 @@ class PolyFun:
             snpvar_bin[ind : ind+bin_size] = True
             df_bins['snpvar_bin%d'%(len(bin_sizes) - bin_i)] = snpvar_bin
             ind += bin_size
-        assert np.all(df_bins.sum(axis=0) == bin_sizes)
+        assert np.all(np.count_nonzero(df_bins.values, axis=0) == bin_sizes)
         df_bins = df_bins.iloc[:, ::-1]
         assert df_bins.shape[0] == df_snpvar.shape[0]
-        assert np.all(df_bins.sum(axis=1)==1)
+        assert np.all(np.count_nonzero(df_bins.values, axis=1)==1)
 
         #reorder df_bins
         df_bins = df_bins.loc[df_snpvar.index]
@@ -517,18 +518,24 @@ class PolyFun:
             self.df_bins = self.partition_snps_Ckmedian(args, use_ridge=use_ridge)
         
         
+    def extract_bins_chr(self, chr_num):
+        df_bins_chr = self.df_bins.query('CHR==%d'%(chr_num))
+        return df_bins_chr
+        
+        
     def save_bins_to_disk(self, args):
         logging.info('Saving SNP-bins to disk')
         for chr_num in tqdm(range(1,23)):
 
             #save bins file to disk
-            df_bins_chr = self.df_bins.query('CHR==%d'%(chr_num))
+            df_bins_chr = self.extract_bins_chr(chr_num)
             bins_chr_file = get_file_name(args, 'bins', chr_num, verify_exists=False)
-            df_bins_chr.to_parquet(bins_chr_file, index=False)
+            df_bins_chr.to_parquet(bins_chr_file, index=False, compression='zstd')
             
             #save M files to disk
             M_chr_file = get_file_name(args, 'M', chr_num, verify_exists=False)
-            M_chr = df_bins_chr.drop(columns=SNP_COLUMNS).sum(axis=0).values
+            bin_colnames = [c for c in df_bins_chr.columns if c not in SNP_COLUMNS]
+            M_chr = np.count_nonzero(df_bins_chr[bin_colnames].to_numpy(dtype=bool), axis=0)
             np.savetxt(M_chr_file, M_chr.reshape((1, M_chr.shape[0])), fmt='%i')
             
             
@@ -621,44 +628,48 @@ class PolyFun:
             chr_range = range(args.chr, args.chr+1)
         
         #iterate over chromosomes and compute LD-scores
-        ###df_ldscores_chr_list = []
-        for chr_num in tqdm(chr_range, disable=len(chr_range)==1):
+        if args.n_jobs == 1:
+            ldscores_obj = self
+        else:
+            #send a fresh object to the worker processes, so that they load the bins from disk instead of receiving a copy of all our data
+            ldscores_obj = self.__class__()
         
-            #load or extract the bins for the current chromosome
-            try:
-                df_bins_chr = self.df_bins.query('CHR==%d'%(chr_num))
-            except AttributeError:
-                df_bins_chr = self.load_bins_chr(args, chr_num)
-                
-            #compute LD-scores for this chromosome
-            if args.ld_ukb:
-                if args.ld_dir is None: ld_dir = tempfile.mkdtemp()
-                else: ld_dir = args.ld_dir
-                df_bins_chr = set_snpid_index(df_bins_chr)
-                df_ldscores_chr = compute_ldscores_chr(df_bins_chr, ld_dir=ld_dir, use_ukb=True)
-            elif args.bfile_chr is not None:
-                df_ldscores_chr = self.compute_ldscores_plink_chr(args, chr_num, df_bins_chr)
-            else:
-                raise ValueError('no LDscore computation method specified')
-                
-            #save the LD-scores to disk
-            ldscores_output_file = get_file_name(args, 'ldscores', chr_num, verify_exists=False)
-            df_ldscores_chr.to_parquet(ldscores_output_file, index=False)
-            
-            # #add the ldscores to the LDscores list
-            # df_ldscores_chr_list.append(df_ldscores_chr)
+        #the worker processes don't inherit our log handlers, so they configure their own
+        configure_logging = (args.n_jobs != 1)
+        results = Parallel(n_jobs=args.n_jobs, return_as='generator')(delayed(ldscores_obj.compute_ld_scores_chr)(args, chr_num, configure_logging) for chr_num in chr_range)
         
-        # #concatenate all the LD-score dfs
-        # if len(df_ldscores_chr_list)==1:
-            # self.df_bin_ldscores = df_ldscores_chr_list[0]
-        # else:
-            # self.df_bin_ldscores = pd.concat(df_ldscores_chr_list, axis=0)
-            # self.df_bin_ldscores.reset_index(inplace=True, drop=True)
+        #update the progress bar whenever a chromosome is done
+        for _ in tqdm(results, total=len(chr_range), disable=len(chr_range)==1):
+            pass
+        
+        
+    def compute_ld_scores_chr(self, args, chr_num, configure_logging=False):
+    
+        #log to the same file as the main process (worker processes are reused, so this is done only once per process)
+        if configure_logging and len(logging.getLogger().handlers)==0:
+            configure_logger(args.output_prefix)
+            
+        #load or extract the bins for the current chromosome
+        try:
+            df_bins_chr = self.extract_bins_chr(chr_num)
+        except AttributeError:
+            df_bins_chr = self.load_bins_chr(args, chr_num)
+            
+        #compute LD-scores for this chromosome
+        if args.ld_ukb:
+            if args.ld_dir is None: ld_dir = tempfile.mkdtemp()
+            else: ld_dir = args.ld_dir
+            df_bins_chr = set_snpid_index(df_bins_chr)
+            df_ldscores_chr = compute_ldscores_chr(df_bins_chr, ld_dir=ld_dir, use_ukb=True)
+        elif args.bfile_chr is not None:
+            df_ldscores_chr = self.compute_ldscores_plink_chr(args, chr_num, df_bins_chr)
+        else:
+            raise ValueError('no LDscore computation method specified')
+            
+        #save the LD-scores to disk
+        ldscores_output_file = get_file_name(args, 'ldscores', chr_num, verify_exists=False)
+        df_ldscores_chr.to_parquet(ldscores_output_file, index=False)
         
-                
-                    
-                
-
         
     def compute_ldscores_plink_chr(self, args, chr_num, df_bins_chr):
     
@@ -805,6 +816,7 @@ if __name__ == '__main__':
     parser.add_argument('--ld-wind-snps', type=int, default=None, help='window size to be used for estimating LD-scores in units of SNPs.')
     parser.add_argument('--chunk-size',  type=int, default=50, help='chunk size for LD-scores calculation')
     parser.add_argument('--keep',  default=None, help='File with ids of individuals to use when computing LD-scores')
+    parser.add_argument('--n-jobs',  type=int, default=1, help='Number of chromosomes to compute LD-scores for in parallel')
     
     #per-SNP h2 related parameters
     parser.add_argument('--q', type=float, default=100, help='The maximum ratio between the largest and smallest truncated per-SNP heritabilites')
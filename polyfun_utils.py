@@ -13,6 +13,9 @@ LONG_RANGE_LD_REGIONS.append({'chr':8, 'start':8000000, 'end':12000000})
 LONG_RANGE_LD_REGIONS.append({'chr':11, 'start':46000000, 'end':57000000})
 DEFAULT_REGIONS_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ukb_regions.tsv.gz')
 
+#directory listings used by file_exists(), keyed by directory name
+_dir_listing_cache = {}
+
 
 
 class TqdmUpTo(tqdm):
@@ -83,6 +86,57 @@ def set_snpid_index(df, copy=False, allow_duplicates=False, allow_swapped_indel_
     return df
 
 
+def get_snpid_keys(df_list, allow_duplicates=False):
+    '''
+        Encode the SNPs of several data frames as int64 keys that can be compared across the data frames.
+        Two SNPs get the same key if and only if set_snpid_index() assigns them the same index, but no strings are created
+    '''
+
+    #factorize all alleles together, using sorted codes so that code order matches string order
+    alleles = np.concatenate([np.concatenate((df['A1'].values, df['A2'].values)) for df in df_list])
+    allele_codes, allele_uniques = pd.factorize(alleles, sort=True)
+    is_long_allele = pd.Series(allele_uniques).str.len().values > 1
+
+    #compute the sorted alleles of every SNP, and encode each pair of sorted alleles as an integer
+    a1_codes_list, a2_codes_list = [], []
+    ind = 0
+    for df in df_list:
+        a1_codes = allele_codes[ind : ind+df.shape[0]]
+        a2_codes = allele_codes[ind+df.shape[0] : ind+2*df.shape[0]]
+        ind += 2*df.shape[0]
+        a1_first = (a1_codes < a2_codes) | is_long_allele[a1_codes] | is_long_allele[a2_codes]
+        a1_codes_list.append(np.where(a1_first, a1_codes, a2_codes))
+        a2_codes_list.append(np.where(a1_first, a2_codes, a1_codes))
+    pair_codes = np.concatenate(a1_codes_list).astype(np.int64) * len(allele_uniques) + np.concatenate(a2_codes_list)
+    pair_codes, pair_uniques = pd.factorize(pair_codes)
+
+    #combine the chromosome, position and allele pair into a single key
+    keys_list = []
+    ind = 0
+    for df in df_list:
+        #(positions are shifted to be non-negative, because plink marks excluded variants with negative positions)
+        bp_shifted = df['BP'].values.astype(np.int64) - np.iinfo(np.int32).min
+        assert np.all((bp_shifted >= 0) & (bp_shifted < 2**32)), 'found BP values that do not fit in 32 bits'
+        position = df['CHR'].values.astype(np.int64) * 2**32 + bp_shifted
+        if df.shape[0] > 0:
+            assert np.abs(position).max() < np.iinfo(np.int64).max // len(pair_uniques)
+        keys = position * len(pair_uniques) + pair_codes[ind : ind+df.shape[0]]
+        ind += df.shape[0]
+
+        #check for duplicate SNPs
+        if not allow_duplicates:
+            is_duplicate_snp = pd.Series(keys).duplicated().values
+            if np.any(is_duplicate_snp):
+                snp_colums = [c for c in ['SNP', 'CHR', 'BP', 'A1', 'A2'] if c in df.columns]
+                df_dup_snps = df.loc[is_duplicate_snp, snp_colums]
+                df_dup_snps = df_dup_snps.loc[~pd.Series(keys[is_duplicate_snp]).duplicated().values]
+                error_msg = 'Duplicate SNPs were found in the input data:\n%s'%(df_dup_snps)
+                raise ValueError(error_msg)
+        keys_list.append(keys)
+
+    return keys_list
+
+
 def configure_logger(out_prefix):
 
     logFormatter = logging.Formatter("[%(levelname)s]  %(message)s")
@@ -99,6 +153,25 @@ def configure_logger(out_prefix):
 
 
 
+def file_exists(file_name):
+    '''
+        Check if a file exists by looking it up in a cached listing of its directory.
+        This requires one system call per directory instead of one per file, which matters on network file systems
+    '''
+    dir_name = os.path.dirname(file_name)
+    if dir_name not in _dir_listing_cache:
+        try:
+            _dir_listing_cache[dir_name] = set(os.listdir(dir_name if len(dir_name)>0 else '.'))
+        except OSError:
+            _dir_listing_cache[dir_name] = set()
+    if os.path.basename(file_name) in _dir_listing_cache[dir_name]:
+        return True
+        
+    #the file may have been created after its directory was listed
+    return os.path.exists(file_name)
+        
+
+
 def get_file_name(args, file_type, chr_num, verify_exists=True, allow_multiple=False):
     if file_type == 'ldscores':
         file_name = args.output_prefix + '.%d.l2.ldscore.parquet'%(chr_num)
@@ -125,7 +198,7 @@ def get_file_name(args, file_type, chr_num, verify_exists=True, allow_multiple=F
         file_name = []
         for ref_ld_chr in args.ref_ld_chr.split(','):
             file_name_part = ref_ld_chr + '%d.annot.gz'%(chr_num)
-            if not os.path.exists(file_name_part):
+            if not file_exists(file_name_part):
                 file_name_part = ref_ld_chr + '%d.annot.parquet'%(chr_num)
             file_name.append(file_name_part)
         
@@ -135,14 +208,14 @@ def get_file_name(args, file_type, chr_num, verify_exists=True, allow_multiple=F
         file_name = []
         for ref_ld_chr in args.ref_ld_chr.split(','):
             file_name_part = ref_ld_chr + '%d.l2.ldscore.gz'%(chr_num)
-            if not os.path.exists(file_name_part):
+            if not file_exists(file_name_part):
                 file_name_part = ref_ld_chr + '%d.l2.ldscore.parquet'%(chr_num)
             file_name.append(file_name_part)
         
     elif file_type == 'w-ld':
         assert verify_exists
         file_name = args.w_ld_chr + '%d.l2.ldscore.gz'%(chr_num)
-        if not os.path.exists(file_name):
+        if not file_exists(file_name):
             file_name = args.w_ld_chr + '%d.l2.ldscore.parquet'%(chr_num)
     
     
@@ -158,10 +231,10 @@ def get_file_name(args, file_type, chr_num, verify_exists=True, allow_multiple=F
     if verify_exists:
         if allow_multiple:
             for fname in file_name:
-                if not os.path.exists(fname):
+                if not file_exists(fname):
                     raise IOError('%s file not found: %s'%(file_type, fname))
         else:
-            if not os.path.exists(file_name):
+            if not file_exists(file_name):
                 raise IOError('%s file not found: %s'%(file_type, file_name))
             
     return file_name
@@ -3,15 +3,79 @@ import pandas as pd
 import os
 import sys
 import time
+import hashlib
+import tempfile
+import glob
 import logging
+from collections import namedtuple
 import scipy.stats as stats
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
+from pyarrow import csv as pa_csv
+from joblib import Parallel, delayed
+try:
+    import polars as pl
+    #polars read_csv() only supports the schema_overrides argument since version 0.20.31
+    from pkg_resources import parse_version
+    if parse_version(pl.__version__) < parse_version('0.20.31'):
+        pl = None
+except ImportError:
+    pl = None
 from polyfun import PolyFun
-from polyfun_utils import configure_logger, set_snpid_index, get_file_name
+from polyfun_utils import configure_logger, get_snpid_keys, get_file_name, file_exists
 from polyfun_utils import SNP_COLUMNS
 from pyarrow import ArrowIOError
 from pyarrow.lib import ArrowInvalid
 
 
+BIM_COLUMNS = ['CHR', 'SNP', 'CM', 'BP', 'A1', 'A2']
+BIM_SCHEMA = pa.schema([('CHR', pa.int8()), ('SNP', pa.string()), ('CM', pa.float32()), ('BP', pa.int32()), ('A1', pa.string()), ('A2', pa.string())])
+BIM_DTYPES = {'CHR':np.int8, 'SNP':str, 'CM':np.float32, 'BP':np.int32, 'A1':str, 'A2':str}
+POSTERIOR_DTYPES = {'CHR':np.int64, 'SNP':str, 'BP':np.int64, 'A1':str, 'A2':str, 'BETA_MEAN':np.float32, 'BETA_SD':np.float32}
+
+#the input and output files of a single chromosome (None for files that aren't used in this run)
+ChromFiles = namedtuple('ChromFiles', ['bim', 'fam', 'bed', 'bins', 'w_ld'])
+
+#invalid combinations of (--compute-partitions, --compute-ldscores, --compute-polyloc), encoded as bitmasks
+INVALID_MODES = {
+    0b000: 'must specify at least one of --compute-partitions, --compute-ldscores, --compute-polyloc',
+    0b101: 'cannot use both --compute-partitions and --compute_polyloc without also specifying --compute-ldscores',
+    0b011: 'cannot use both --compute-ldscores and --compute_polyloc without also specifying --compute-partitions',
+}
+
+#arguments that can only be used with some of the computations, and arguments that some of the computations require
+RESTRICTED_ARGS = {
+    'chr': '--chr can only be specified when using only --compute-ldscores (partitioning SNPs into bins and estimating their heritability require all chromosomes together)',
+    'bfile_chr': '--bfile-chr can only be specified when using --compute-partitions or --compute-ldscores',
+    'ld_ukb': '--ld-ukb can only be specified when using --compute-partitions or --compute-ldscores',
+    'posterior': '--posterior can only be specified together with --compute-partitions',
+    'sumstats': '--sumstats can only be specified together with --compute-polyloc',
+    'ld_wind_cm': '--ld-wind parameters can only be specified together with --compute-ldscores',
+    'ld_wind_kb': '--ld-wind parameters can only be specified together with --compute-ldscores',
+    'ld_wind_snps': '--ld-wind parameters can only be specified together with --compute-ldscores',
+    'keep': '--keep can only be specified together with --compute-ldscores',
+}
+REQUIRED_ARGS = {
+    'bfile_chr': 'You must specify --bfile-chr when you specify --compute-partitions or --compute-ldscores',
+    'posterior': '--posterior must be specified when using --compute-partitions',
+    'sumstats': '--sumstats must be specified when using --compute-polyloc',
+    'w_ld_chr': '--w-ld-chr must be specified when using --compute-polyloc',
+}
+
+#the arguments required by and allowed for each valid combination of computations
+LDSCORE_ARGS = ['bfile_chr', 'ld_ukb', 'ld_wind_cm', 'ld_wind_kb', 'ld_wind_snps', 'keep']
+MODE_ARGS = {
+    0b100: {'required': ['bfile_chr', 'posterior'], 'allowed': ['bfile_chr', 'ld_ukb', 'posterior']},
+    0b010: {'required': ['bfile_chr'], 'allowed': LDSCORE_ARGS + ['chr']},
+    0b001: {'required': ['sumstats', 'w_ld_chr'], 'allowed': ['sumstats']},
+    0b110: {'required': ['bfile_chr', 'posterior'], 'allowed': LDSCORE_ARGS + ['posterior']},
+    0b111: {'required': ['bfile_chr', 'posterior', 'sumstats', 'w_ld_chr'], 'allowed': LDSCORE_ARGS + ['posterior', 'sumstats']},
+}
+for mode_args in MODE_ARGS.values():
+    mode_args['forbidden'] = [arg_name for arg_name in RESTRICTED_ARGS if arg_name not in mode_args['allowed']]
+
+
 def splash_screen():
     print('*********************************************************************')
     print('* PolyLoc (POLYgenic LOCalization of complex trait heritability')
@@ -21,69 +85,68 @@ def splash_screen():
     print()
     
     
+def is_specified(value):
+    return value is not None and value is not False
+
+
 def check_args(args):
     
     #verify that the requested computations are valid
-    mode_params = np.array([args.compute_partitions, args.compute_ldscores, args.compute_polyloc])
-    if np.sum(mode_params)==0:
-        raise ValueError('must specify at least one of --compute-partitions, --compute-ldscores, --compute-polyloc')
-    if args.compute_partitions and args.compute_polyloc and not args.compute_ldscores:
-        raise ValueError('cannot use both --compute-partitions and --compute_polyloc without also specifying --compute-ldscores')
-    if args.chr is not None:
-        if args.compute_partitions or args.compute_polyloc:
-            raise ValueError('--chr can only be specified when using only --compute-ldscores')
-    if args.bfile_chr is not None:
-        if not args.compute_ldscores and not args.compute_partitions:
-            raise ValueError('--bfile-chr can only be specified when using --compute-partitions or --compute-ldscores')
-    if args.ld_ukb:
-        if not args.compute_ldscores and not args.compute_partitions:
-            raise ValueError('--ld-ukb can only be specified when using --compute-partitions or --compute-ldscores')
-    if args.compute_ldscores and args.compute_polyloc and not args.compute_partitions:
-        raise ValueError('cannot use both --compute-ldscores and --compute_polyloc without also specifying --compute-partitions')    
-        
-    if args.posterior is not None and not args.compute_partitions:
-        raise ValueError('--posterior can only be specified together with --compute-partitions')        
-    if args.sumstats is not None and not args.compute_polyloc:
-        raise ValueError('--sumstats can only be specified together with --compute-polyloc')
+    mode = (args.compute_partitions<<2) | (args.compute_ldscores<<1) | int(args.compute_polyloc)
+    if mode in INVALID_MODES:
+        raise ValueError(INVALID_MODES[mode])
+        
+    #verify that the specified arguments are compatible with the requested computations
+    for arg_name in MODE_ARGS[mode]['forbidden']:
+        if is_specified(getattr(args, arg_name)):
+            raise ValueError(RESTRICTED_ARGS[arg_name])
+    if args.chr is not None and not (1 <= args.chr <= 22):
+        raise ValueError('--chr must be a number between 1 and 22')
     if args.ld_dir is not None and not args.ld_ukb:
         raise ValueError('You cannot specify --ld-dir without also specifying --ld-ukb')
-        
     
     #verify partitioning parameters
     if args.skip_Ckmedian and (args.num_bins is None or args.num_bins<=0):
         raise ValueError('You must specify --num-bins when using --skip-Ckmedian')        
 
-    #partitionining-related parameters
-    if args.compute_partitions:
-        if args.bfile_chr is None:
-            raise ValueError('You must specify --bfile-chr when you specify --compute-partitions')
-        if args.posterior is None:
-            raise ValueError('--posterior must be specified when using --compute-partitions')
+    #verify that the arguments required by the requested computations are specified
+    for arg_name in MODE_ARGS[mode]['required']:
+        if getattr(args, arg_name) is None:
+            raise ValueError(REQUIRED_ARGS[arg_name])
             
     #verify LD-score related parameters
     if args.compute_ldscores:
-        if args.bfile_chr is None:
-            raise ValueError('You must specify --bfile-chr when you specify --compute-ldscores')    
         if not args.ld_ukb and (args.ld_wind_cm is None and args.ld_wind_kb is None and args.ld_wind_snps is None):
             args.ld_wind_cm = 1.0
             logging.warning('no ld-wind argument specified.  PolyLoc will use --ld-cm 1.0')
-
-    if not args.compute_ldscores:
-        if not (args.ld_wind_cm is None and args.ld_wind_kb is None and args.ld_wind_snps is None):
-            raise ValueError('--ld-wind parameters can only be specified together with --compute-ldscores')
-        if args.keep is not None:
-            raise ValueError('--keep can only be specified together with --compute-ldscores')
-        if args.chr is not None:
-            raise ValueError('--chr can only be specified together with --compute-ldscores')
-
-    if args.compute_polyloc:
-        if args.sumstats is None:
-            raise ValueError('--sumstats must be specified when using --compute-polyloc')    
-        if args.w_ld_chr is None:
-            raise ValueError('--w-ld-chr must be specified when using --compute-polyloc')    
             
     return args
 
+def get_chrom_files(args):
+    chrom_files = []
+    for chr_num in range(1,23):
+        if args.bfile_chr is None:
+            bim_file, fam_file, bed_file = None, None, None
+        else:
+            bim_file = get_file_name(args, 'bim', chr_num, verify_exists=False)
+            fam_file = get_file_name(args, 'fam', chr_num, verify_exists=False)
+            bed_file = get_file_name(args, 'bed', chr_num, verify_exists=False)
+        bins_file = get_file_name(args, 'bins', chr_num, verify_exists=False)
+        
+        #the w-ld file name depends on which files exist, so get_file_name also verifies that it exists
+        if args.compute_polyloc:
+            w_ld_file = get_file_name(args, 'w-ld', chr_num, verify_exists=True)
+        else:
+            w_ld_file = None
+        chrom_files.append(ChromFiles(bim=bim_file, fam=fam_file, bed=bed_file, bins=bins_file, w_ld=w_ld_file))
+    return chrom_files
+    
+    
+def check_file_exists(file_type, file_name):
+    if not file_exists(file_name):
+        raise IOError('%s file not found: %s'%(file_type, file_name))
+        
+
 def check_files(args):
 
     if args.compute_partitions:
@@ -96,21 +159,103 @@ def check_files(args):
         else: chr_range = range(args.chr, args.chr+1)
         
         for chr_num in chr_range:
-            get_file_name(args, 'bim', chr_num, verify_exists=True)
+            chrom_files = args.chrom_files[chr_num-1]
+            check_file_exists('bim', chrom_files.bim)
             if not args.ld_ukb:
-                get_file_name(args, 'fam', chr_num, verify_exists=True)
-                get_file_name(args, 'bed', chr_num, verify_exists=True)
+                check_file_exists('fam', chrom_files.fam)
+                check_file_exists('bed', chrom_files.bed)
             if not args.compute_partitions:
-                get_file_name(args, 'bins', chr_num, verify_exists=True)
+                check_file_exists('bins', chrom_files.bins)
                 
+    #(the w-ld files were already verified by get_chrom_files)
     if args.compute_polyloc:    
-        for chr_num in range(1,23):
-            get_file_name(args, 'w-ld', chr_num, verify_exists=True)
+        for chrom_files in args.chrom_files:
             if not args.compute_partitions:
-                get_file_name(args, 'bins', chr_num, verify_exists=True)
+                check_file_exists('bins', chrom_files.bins)
             
         
+        
+def read_bim_file(bim_file):
+
+    #plink writes tab-delimited bim files, but some tools write space-delimited ones
+    with open(bim_file) as f:
+        is_tab_delimited = '\t' in f.readline()
+        
+    #use the polars CSV parser if it's installed, and otherwise the pyarrow one
+    if is_tab_delimited and pl is not None:
+        df_bim = pl.read_csv(bim_file, separator='\t', has_header=False, new_columns=BIM_COLUMNS,
+                             schema_overrides={'CHR':pl.Int8, 'SNP':pl.Utf8, 'CM':pl.Float32, 'BP':pl.Int32, 'A1':pl.Utf8, 'A2':pl.Utf8})
+        table = df_bim.to_arrow().cast(BIM_SCHEMA)
+    elif is_tab_delimited:
+        table = pa_csv.read_csv(bim_file,
+                                read_options=pa_csv.ReadOptions(column_names=BIM_COLUMNS),
+                                parse_options=pa_csv.ParseOptions(delimiter='\t'),
+                                convert_options=pa_csv.ConvertOptions(column_types=BIM_SCHEMA))
+    else:
+        #parse integers as int64, because the pandas parser silently wraps values that don't fit in narrower types,
+        #whereas the conversion to the Arrow schema raises an error for them
+        dtypes = dict(BIM_DTYPES, CHR=np.int64, BP=np.int64)
+        df_bim = pd.read_table(bim_file, sep=r'\s+', engine='c', names=BIM_COLUMNS, header=None, dtype=dtypes, na_filter=False, memory_map=True)
+        table = pa.Table.from_pandas(df_bim, schema=BIM_SCHEMA, preserve_index=False)
+    return table
+    
+    
+def read_bim_files(bim_files, cache_prefix=None):
 
+    #look for a cached copy of the concatenated bim files, identified by their paths, sizes and modification times
+    if cache_prefix is not None:
+        bim_stats = [(os.path.abspath(bim_file), os.stat(bim_file)) for bim_file in bim_files]
+        bim_hash = hashlib.md5('|'.join('%s:%d:%d'%(bim_file, st.st_size, st.st_mtime_ns) for bim_file, st in bim_stats).encode()).hexdigest()
+        cache_file = cache_prefix + '.bim.%s.feather'%(bim_hash)
+        if os.path.exists(cache_file):
+            logging.info('Reading cached bim files from %s'%(cache_file))
+            return feather.read_table(cache_file, memory_map=True).to_pandas(split_blocks=True)
+            
+    #read the bim files in a thread pool (the pyarrow and polars parsers release the GIL) and keep only the SNP columns
+    bim_tables = Parallel(n_jobs=-1, prefer='threads')(delayed(read_bim_file)(bim_file) for bim_file in bim_files)
+    bim_table = pa.concat_tables(bim_tables).select(SNP_COLUMNS)
+    
+    #write the cache file atomically, so that concurrent runs never see a partial file
+    if cache_prefix is not None:
+        logging.info('Caching bim files in %s'%(cache_file))
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_file)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                feather.write_feather(bim_table, f)
+            os.replace(tmp_file, cache_file)
+        except:
+            os.remove(tmp_file)
+            raise
+            
+        #remove cache files of previous versions of the bim files
+        for old_cache_file in glob.glob(glob.escape(cache_prefix) + '.bim.' + '[0-9a-f]'*32 + '.feather'):
+            if old_cache_file != cache_file:
+                os.remove(old_cache_file)
+            
+    return bim_table.to_pandas(split_blocks=True, self_destruct=True)
+    
+    
+def write_tsv(df, outfile, float_decimals=None):
+
+    #pyarrow quotes string values, so only numeric columns are supported
+    for c in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[c]):
+            raise ValueError('cannot write non-numeric column %s to %s'%(c, outfile))
+            
+    #round float columns in numpy, because pyarrow doesn't support a float format
+    #(NaNs are converted to nulls so that they're written as empty fields, and -0 is written as 0)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for col_i, field in enumerate(table.schema):
+        if pa.types.is_floating(field.type):
+            values = table.column(col_i).to_numpy()
+            if float_decimals is not None:
+                values = np.round(values, float_decimals)
+            table = table.set_column(col_i, field, pa.array(values + 0.0, from_pandas=True))
+                
+    #write the header ourselves, because pyarrow quotes column names
+    with open(outfile, 'wb') as f:
+        f.write(('\t'.join(table.column_names) + '\n').encode())
+        pa_csv.write_csv(table, f, pa_csv.WriteOptions(include_header=False, delimiter='\t'))
     
 
 class PolyLoc(PolyFun):
@@ -119,9 +264,22 @@ class PolyLoc(PolyFun):
         
     def load_posterior_betas(self, args):
         try:
-            df_posterior = pd.read_parquet(args.posterior)
+            posterior_file = pq.ParquetFile(args.posterior)
         except (ArrowIOError, ArrowInvalid):
-            df_posterior = pd.read_table(args.posterior, sep='\s+')
+            #read only the columns that we need, with explicit types (column names are case-insensitive)
+            header = pd.read_table(args.posterior, sep=r'\s+', nrows=0).columns
+            dtypes = {c:POSTERIOR_DTYPES[c.upper()] for c in header if c.upper() in POSTERIOR_DTYPES}
+            df_posterior = pd.read_table(args.posterior, sep=r'\s+', engine='c', usecols=list(dtypes.keys()), dtype=dtypes, na_filter=False)
+        else:
+            #read only the columns that we need (column names are case-insensitive)
+            columns = [c for c in posterior_file.schema_arrow.names if c.upper() in POSTERIOR_DTYPES]
+            table = posterior_file.read(columns=columns, use_threads=True)
+            
+            #cast the numeric columns to the same types used for text files (the cast fails if a value doesn't fit)
+            for c in columns:
+                if POSTERIOR_DTYPES[c.upper()] is not str:
+                    table = table.set_column(table.schema.get_field_index(c), c, table[c].cast(pa.from_numpy_dtype(POSTERIOR_DTYPES[c.upper()])))
+            df_posterior = table.to_pandas(split_blocks=True, self_destruct=True)
             
         #preprocess columns
         df_posterior.columns = df_posterior.columns.str.upper()
@@ -135,47 +293,76 @@ class PolyLoc(PolyFun):
         if has_missing_col:
             raise ValueError('%s has missing columns'%(args.posterior))
             
-        df_posterior['SNPVAR'] = df_posterior['BETA_MEAN']**2 + df_posterior['BETA_SD']**2
+        #store chromosome numbers and positions in narrow integer types, after checking that they fit
+        for column, dtype in [('CHR', np.int8), ('BP', np.int32)]:
+            assert df_posterior[column].between(np.iinfo(dtype).min, np.iinfo(dtype).max).all(), 'found %s values that do not fit in %s'%(column, np.dtype(dtype).name)
+            df_posterior[column] = df_posterior[column].astype(dtype)
+            
+        #compute BETA_MEAN^2 + BETA_SD^2 in place, without creating intermediate Series
+        #(the effect sizes are stored as float32, but their squares are computed and stored as float64)
+        snpvar = np.square(df_posterior['BETA_MEAN'].to_numpy(), dtype=np.float64)
+        np.add(snpvar, np.square(df_posterior['BETA_SD'].to_numpy(), dtype=np.float64), out=snpvar)
+        df_posterior['SNPVAR'] = snpvar
         self.df_snpvar = df_posterior
         
         
+    def partition_snps_to_bins(self, args, use_ridge):
+    
+        #partition SNPs into bins, and then encode the bin of each SNP as a single integer instead of one boolean column per bin
+        super().partition_snps_to_bins(args, use_ridge=use_ridge)
+        bin_colnames = [c for c in self.df_bins.columns if c not in SNP_COLUMNS]
+        assert bin_colnames == ['snpvar_bin%d'%(bin_i) for bin_i in range(1, len(bin_colnames)+1)]
+        bin_ids = np.argmax(self.df_bins[bin_colnames].values, axis=1) + 1
+        self.df_bins = self.df_bins[SNP_COLUMNS].copy()
+        self.df_bins['BIN_ID'] = bin_ids.astype(np.int16)
+        self.num_bins = len(bin_colnames)
+        
+        
+    def extract_bins_chr(self, chr_num):
+    
+        #expand the bin IDs of this chromosome into one boolean column per bin, as expected by S-LDSC
+        df_bins_chr = self.df_bins.query('CHR==%d'%(chr_num))
+        is_in_bin = df_bins_chr['BIN_ID'].values[:, np.newaxis] == np.arange(1, self.num_bins+1)
+        bin_colnames = ['snpvar_bin%d'%(bin_i) for bin_i in range(1, self.num_bins+1)]
+        df_bins_chr = pd.concat([df_bins_chr[SNP_COLUMNS], pd.DataFrame(is_in_bin, index=df_bins_chr.index, columns=bin_colnames)], axis=1)
+        return df_bins_chr
+        
+        
     def polyloc_partitions(self, args):
     
         self.load_posterior_betas(args)    
         self.partition_snps_to_bins(args, use_ridge=False)
         
         #add another partition for all SNPs not in the posterior file
-        df_bim_list = []
-        for chr_num in range(1,23):
-            df_bim_chr = pd.read_table(args.bfile_chr+'%d.bim'%(chr_num), sep='\s+', names=['CHR', 'SNP', 'CM', 'BP', 'A1', 'A2'], header=None)
-            df_bim_list.append(df_bim_chr)
-        df_bim = pd.concat(df_bim_list, axis=0)
-        df_bim = set_snpid_index(df_bim)
-        self.df_bins = set_snpid_index(self.df_bins)
+        bim_files = [chrom_files.bim for chrom_files in args.chrom_files]
+        df_bim = read_bim_files(bim_files, cache_prefix=(args.output_prefix if args.cache_bim else None))
+        bim_keys, bins_keys = get_snpid_keys([df_bim, self.df_bins])
         
         #make sure that all variants in the posterior file are also in the plink files
-        if np.any(~self.df_bins.index.isin(df_bim.index)):
+        #(there are no duplicate keys, so this holds iff every posterior SNP is matched by a plink SNP)
+        is_new_snp = ~np.isin(bim_keys, bins_keys)
+        if df_bim.shape[0] - is_new_snp.sum() < self.df_bins.shape[0]:
             raise ValueError('Found variants in posterior file that are not found in the plink files')
             
         #add a new bin for SNPs that are not found in the posterior file (if there are any)
-        if df_bim.shape[0] > self.df_bins.shape[0]:
-            new_snps = df_bim.index[~df_bim.index.isin(self.df_bins.index)]
-            df_bins_new = df_bim.loc[new_snps, SNP_COLUMNS].copy()
-            for colname in self.df_bins.drop(columns=SNP_COLUMNS).columns:
-                df_bins_new[colname] = False
-            new_colname = 'snpvar_bin%d'%(df_bins_new.shape[1] - len(SNP_COLUMNS)+1)
-            self.df_bins[new_colname] = False
-            df_bins_new[new_colname] = True
-            self.df_bins = pd.concat([self.df_bins, df_bins_new], axis=0)
+        #(each column is concatenated once and the data frame is created once, instead of concatenating data frames)
+        if np.any(is_new_snp):
+            self.num_bins += 1
+            bins_columns = {c:np.concatenate((self.df_bins[c].values, df_bim[c].values[is_new_snp])) for c in SNP_COLUMNS}
+            bins_columns['BIN_ID'] = np.concatenate((self.df_bins['BIN_ID'].values, np.full(is_new_snp.sum(), self.num_bins, dtype=np.int16)))
+            self.df_bins = pd.DataFrame(bins_columns, copy=False)
         
         #save the bins to disk
         self.save_bins_to_disk(args)
         
         #save the bin sizes to disk
-        df_binsize = pd.DataFrame(index=np.arange(1,self.df_bins.shape[1] - len(SNP_COLUMNS)+1))
+        df_binsize = pd.DataFrame(index=np.arange(1, self.num_bins+1))
         df_binsize.index.name='BIN'
-        df_binsize['BIN_SIZE'] = [self.df_bins[c].sum() for c in self.df_bins.drop(columns=SNP_COLUMNS).columns]   #saves memory
-        df_binsize.to_csv(args.output_prefix+'.binsize', sep='\t', index=True)
+        df_binsize['BIN_SIZE'] = np.bincount(self.df_bins['BIN_ID'].values, minlength=self.num_bins+1)[1:]
+        self.df_binsize = df_binsize.reset_index()
+        self.df_binsize.to_parquet(args.output_prefix+'.binsize.parquet', index=False)
+        if args.binsize_tsv:
+            write_tsv(self.df_binsize, args.output_prefix+'.binsize')
         
         
     def compute_per_bin_h2(self, prop_h2, prop_h2_jk, df_binsize):
@@ -242,8 +429,14 @@ class PolyLoc(PolyFun):
         taus = jknife.est[0, :hsqhat.n_annot] / hsqhat.Nbar
         taus_jk = jknife.delete_values[:, :hsqhat.n_annot] / hsqhat.Nbar
         
-        #load bin sizes
-        df_binsize = pd.read_table(args.output_prefix+'.binsize', sep='\t')
+        #load bin sizes (falling back to the .binsize files of older PolyLoc versions)
+        try:
+            df_binsize = self.df_binsize
+        except AttributeError:
+            if os.path.exists(args.output_prefix+'.binsize.parquet'):
+                df_binsize = pd.read_parquet(args.output_prefix+'.binsize.parquet')
+            else:
+                df_binsize = pd.read_table(args.output_prefix+'.binsize', sep='\t', dtype={'BIN':np.int32, 'BIN_SIZE':np.int64})
         
         #compute prop_h2 for the main analysis and for each jackknife block
         prop_h2 = taus * df_binsize['BIN_SIZE'].values
@@ -260,12 +453,12 @@ class PolyLoc(PolyFun):
         
         #write df_bin_h2 to output file
         outfile = args.output_prefix+'.bin_h2'
-        df_bin_h2.to_csv(outfile, sep='\t', float_format='%0.5f', index=False)
+        write_tsv(df_bin_h2, outfile, float_decimals=5)
         logging.info('Wrote per-bin heritability to %s'%(outfile))
         
         #write df_Mp to output file
         outfile = args.output_prefix+'.Mp'
-        df_Mp.to_csv(outfile, sep='\t', float_format='%0.5f', index=False)
+        write_tsv(df_Mp, outfile, float_decimals=5)
         logging.info('Wrote Mp estimates to %s'%(outfile))
         
         
@@ -307,13 +500,14 @@ if __name__ == '__main__':
     parser.add_argument('--compute-polyloc', default=False, action='store_true', help='If specified, PolyLoc will perform polygenic localization of SNP heritability')
     
     #ld-score related parameters
-    parser.add_argument('--chr', type=int, default=None, help='Chromosome number (only applicable when only specifying --ldscores). If not set, PolyLoc will compute LD-scores for all chromosomes')
+    parser.add_argument('--chr', type=int, default=None, help='Chromosome number (only applicable when only specifying --compute-ldscores). If not set, PolyLoc will compute LD-scores for all chromosomes. The per-chromosome LD-score files can be computed in separate runs (e.g. on a cluster), and are then used directly by --compute-polyloc')
     #parser.add_argument('--npz-prefix', default=None, help='Prefix of npz files that encode LD matrices (used to compute LD-scores)')
     parser.add_argument('--ld-wind-cm', type=float, default=None, help='window size to be used for estimating LD-scores in units of centiMorgans (cM).')
     parser.add_argument('--ld-wind-kb', type=int, default=None, help='window size to be used for estimating LD-scores in units of Kb.')
     parser.add_argument('--ld-wind-snps', type=int, default=None, help='window size to be used for estimating LD-scores in units of SNPs.')
     parser.add_argument('--chunk-size',  type=int, default=50, help='chunk size for LD-scores calculation')
     parser.add_argument('--keep',  default=None, help='File with ids of individuals to use when computing LD-scores')
+    parser.add_argument('--n-jobs',  type=int, default=1, help='Number of chromosomes to process in parallel when computing LD-scores (plink .bim files are always read in parallel threads)')
     
     #data input/output parameters
     parser.add_argument('--sumstats', help='Input summary statistics file')
@@ -323,6 +517,8 @@ if __name__ == '__main__':
     parser.add_argument('--output-prefix', required=True, help='Prefix of all PolyLoc out file names')    
     parser.add_argument('--ld-ukb', default=False, action='store_true', help='If specified, PolyLoc will use UKB LD matrices to compute LD-scores')
     parser.add_argument('--ld-dir', default=None, help='The path of a directory with UKB LD files (if not specified PolyLoc will create a temporary directory)')
+    parser.add_argument('--cache-bim', default=False, action='store_true', help='If specified, PolyLoc will cache the concatenated plink .bim files in a feather file named after the output prefix, and will reuse it in later runs as long as the .bim files are unchanged (older cache files with the same prefix are deleted)')
+    parser.add_argument('--binsize-tsv', default=False, action='store_true', help='If specified, PolyLoc will also write the bin sizes to a tab-delimited .binsize file (the bin sizes are always written to a .binsize.parquet file)')
     
     
     
@@ -341,9 +537,15 @@ if __name__ == '__main__':
     
     #configure logger
     configure_logger(args.output_prefix)
+    
+    #PolyLoc writes its output files with pyarrow.csv.write_csv(), which only supports a custom delimiter since pyarrow 8.0
+    from pkg_resources import parse_version
+    if parse_version(pa.__version__) < parse_version('8.0.0'):
+        raise ValueError('your pyarrow version is too old --- please update pyarrow to version 8.0 or later')
         
     #check and fix args
     args = check_args(args)
+    args.chrom_files = get_chrom_files(args)
     check_files(args)
     args.anno = None
     
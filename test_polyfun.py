@@ -191,7 +191,101 @@ def test_polyloc(tmpdir, python3_exe):
         compare_dfs(tmpdir, gold_dir, outfile)
         
         
+def test_polyloc_check_args():
+    import argparse
+    from polyloc import check_args, MODE_ARGS, INVALID_MODES
+    
+    def make_args(mode, **kwargs):
+        args = argparse.Namespace(compute_partitions=bool(mode & 0b100), compute_ldscores=bool(mode & 0b010), compute_polyloc=bool(mode & 0b001),
+                                  chr=None, bfile_chr=None, ld_ukb=False, ld_dir=None, posterior=None, sumstats=None, w_ld_chr=None,
+                                  ld_wind_cm=None, ld_wind_kb=None, ld_wind_snps=None, keep=None, skip_Ckmedian=False, num_bins=None)
+        if mode in MODE_ARGS:
+            for arg_name in MODE_ARGS[mode]['required']:
+                setattr(args, arg_name, 'x')
+        for arg_name, value in kwargs.items():
+            setattr(args, arg_name, value)
+        return args
+        
+    def is_valid(args):
+        try:
+            check_args(args)
+        except ValueError:
+            return False
+        return True
+        
+    #partitions+polyloc and ldscores+polyloc are the only invalid non-empty combinations of computations
+    assert set(INVALID_MODES.keys()) == set([0b000, 0b101, 0b011])
+    for mode in range(8):
+        assert is_valid(make_args(mode)) == (mode in MODE_ARGS)
+        
+    #arguments that can only be used with some of the computations
+    for mode in MODE_ARGS:
+        assert is_valid(make_args(mode, chr=1)) == (mode == 0b010)
+        assert is_valid(make_args(mode, keep='x')) == bool(mode & 0b010)
+        assert is_valid(make_args(mode, ld_wind_kb=100)) == bool(mode & 0b010)
+        assert is_valid(make_args(mode, posterior='x')) == bool(mode & 0b100)
+        assert is_valid(make_args(mode, sumstats='x')) == bool(mode & 0b001)
+        assert is_valid(make_args(mode, bfile_chr='x')) == bool(mode & 0b110)
+        assert is_valid(make_args(mode, ld_ukb=True)) == bool(mode & 0b110)
+        
+    #arguments that are required by some of the computations
+    assert not is_valid(make_args(0b100, posterior=None))
+    assert not is_valid(make_args(0b010, bfile_chr=None))
+    assert not is_valid(make_args(0b001, w_ld_chr=None))
+    assert not is_valid(make_args(0b111, sumstats=None))
+    
+    #--chr must be a valid chromosome number
+    assert not is_valid(make_args(0b010, chr=0))
+    assert not is_valid(make_args(0b010, chr=23))
+    assert is_valid(make_args(0b010, chr=22))
+    
+    #other argument dependencies
+    assert not is_valid(make_args(0b010, ld_dir='x'))
+    assert is_valid(make_args(0b010, ld_dir='x', ld_ukb=True))
+    assert not is_valid(make_args(0b100, skip_Ckmedian=True))
+    assert is_valid(make_args(0b100, skip_Ckmedian=True, num_bins=10))
+    assert check_args(make_args(0b010)).ld_wind_cm == 1.0
+    assert check_args(make_args(0b010, ld_ukb=True)).ld_wind_cm is None
 
+
+def test_get_snpid_keys():
+    from polyfun_utils import get_snpid_keys, set_snpid_index
+
+    #SNPs get the same key if and only if they get the same snpid index
+    rng = np.random.RandomState(0)
+    alleles = np.array(['A', 'C', 'G', 'T', 'AT', 'CTG'])
+    for trial in range(50):
+        df_list = []
+        for num_snps in rng.randint(0, 100, size=2):
+            df = pd.DataFrame({'CHR':rng.randint(1, 4, size=num_snps), 'BP':rng.choice([-3, -1, 1, 2, 5, 2**31-1], size=num_snps),
+                               'A1':rng.choice(alleles, size=num_snps), 'A2':rng.choice(alleles, size=num_snps)})
+            df_list.append(df)
+        keys = np.concatenate(get_snpid_keys(df_list, allow_duplicates=True))
+        snpids = np.concatenate([set_snpid_index(df, copy=True, allow_duplicates=True).index.values for df in df_list])
+        assert np.all(pd.factorize(keys)[0] == pd.factorize(snpids)[0])
+
+    #duplicate SNPs (with swapped alleles) are rejected
+    df = pd.DataFrame({'CHR':[1,1], 'BP':[5,5], 'A1':['A','C'], 'A2':['C','A']})
+    try:
+        get_snpid_keys([df])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('duplicate SNPs were not detected')
+
+    #negative positions (used by plink to mark excluded variants) on different chromosomes are different SNPs
+    df_neg = pd.DataFrame({'CHR':[1,3], 'BP':[-1,-1], 'A1':['A','A'], 'A2':['C','C']})
+    keys = get_snpid_keys([df_neg])[0]
+    assert keys[0] != keys[1]
+    keys1, keys3 = get_snpid_keys([df_neg.iloc[:1], df_neg.iloc[1:]])
+    assert keys1[0] != keys3[0]
+
+    #empty data frames are allowed
+    df_empty = pd.DataFrame({'CHR':np.zeros(0, dtype=np.int64), 'BP':np.zeros(0, dtype=np.int64), 'A1':np.zeros(0, dtype=object), 'A2':np.zeros(0, dtype=object)})
+    assert len(get_snpid_keys([df_empty])[0]) == 0
+    assert len(get_snpid_keys([df_empty, df], allow_duplicates=True)[1]) == 2
+
+        
    
     
         
@@ -299,6 +393,8 @@ if __name__ == '__main__':
     test_finemapper_susie(temp_dir, args.python3)
     test_finemapper_finemap(temp_dir, args.python3, args.finemap_exe)
         
+    test_polyloc_check_args()
+    test_get_snpid_keys()
     test_polyloc(temp_dir, args.python3)
     test_polyfun(temp_dir, args.python3)
     test_extract_snpvar(temp_dir, args.python3)